@@ -0,0 +1,13 @@
+# Gunicorn settings for serving iss_tracker:app in the container
+bind = "0.0.0.0:5000"
+
+# Worker processes for CPU work (Astropy) and threads per worker for I/O waits (Redis, Nominatim)
+workers = 4
+worker_class = "gthread"
+threads = 8
+
+def post_worker_init(worker):
+    # Every worker runs the ingest loop, the data set age and the Redis lock in _ingest_loop let only one of them
+    # download per refresh interval
+    import iss_tracker
+    iss_tracker.start_ingest()
@@ -1,14 +1,19 @@
 #!/usr/bin/env python3
-import xmltodict
-import json
+import msgspec
+import orjson
 import logging
 import requests
-import math
 import socket
+import threading
 import time
+import calendar
+import math
+import functools
+import numpy as np
 from typing import List
 from typing import Tuple
-from flask import Flask, request
+from flask import Flask, request, Response
+from lxml import etree
 import redis
 from astropy import coordinates
 from astropy import units
@@ -23,66 +28,302 @@ app = Flask(__name__)
 format_str=f'[%(asctime)s {socket.gethostname()}] %(filename)s:%(funcName)s:%(lineno)s - %(levelname)s: %(message)s'
 logging.basicConfig(level=logging.ERROR, format = format_str)
 
-def get_redis_client():
-    return redis.Redis(host='redis-db', port=6379, db=0)
+def get_redis_client(decode_responses: bool = True):
+    return redis.Redis(host='redis-db', port=6379, db=0, decode_responses=decode_responses)
 
-# Initialize Redis client
+# Initialize Redis clients, the binary client is used for the raw NumPy array bytes
 rd = get_redis_client()
+rd_bin = get_redis_client(decode_responses=False)
+
+# Shared HTTP session so repeat downloads reuse the keep-alive connection and ask for gzip
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept-Encoding": "gzip"})
+_SESSION.mount("https://", requests.adapters.HTTPAdapter(max_retries=3))
+
+# Single geocoder reused by every reverse lookup, with an explicit timeout on each Nominatim call. geopy's default
+# RequestsAdapter already keeps a pooled keep-alive session to Nominatim
+_GEOCODER = Nominatim(user_agent="iss_tracker", timeout=5)
+
+# Seconds between background refreshes of the NASA data
+REFRESH_INTERVAL = 6 * 3600
+
+# Seconds to wait before trying again after a failed ingest
+RETRY_INTERVAL = 60
+
+# Number of state vectors written per MSET during ingest
+WRITE_BATCH_SIZE = 1000
+
+# Redis lock held while one process downloads and stores the NASA data
+INGEST_LOCK_KEY = "iss_ingest_lock"
+
+# Reverse geocode results are cached in Redis under "geo:<lat>:<lon>" for a day
+GEO_PREFIX = "geo:"
+GEO_TTL = 86400
+
+# Redis key holding a signature that changes every time fetch_data stores a new data set. Versioned so a
+# data set stored in an older layout is re-ingested instead of being read back
+SIG_KEY = "iss_sig:v2"
+
+# State vector fields stored as float64 arrays under "iss:<field>" keys, plus the epoch list under "iss:EPOCH"
+ARRAY_FIELDS = ("X", "Y", "Z", "X_DOT", "Y_DOT", "Z_DOT")
+ARRAY_PREFIX = "iss:"
+
+# Arrays derived from the fields at ingest and stored next to them
+DERIVED_ARRAYS = ("SPEED", "EPOCH_TS", "LAT", "LON", "ALT")
+
+# Reusable msgspec MessagePack encoder and typed decoders for the values stored in Redis
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder()
+_STATE_VECTOR_DECODER = msgspec.msgpack.Decoder(dict)
+_EPOCH_LIST_DECODER = msgspec.msgpack.Decoder(list[str])
+
+# In-process cache of the decoded state vectors and arrays, valid while the Redis signature is unchanged
+_CACHE = {"sig": None, "checked": None, "data": None, "by_epoch": None, "arrays": None}
+
+# Seconds the cache is trusted before the Redis signature is checked again
+CACHE_TTL = 300
+
+# Seconds a rendered /now response is reused before it is built again
+NOW_TTL = 5
+
+# The last rendered /now response as a (NOW_TTL bucket, response) tuple
+_NOW_CACHE = {"last": None}
+
+# Held while the cache is checked or filled so concurrent request threads do not reload it at the same time
+_CACHE_LOCK = threading.RLock()
 
-def fetch_data():
+def _sync_cache() -> bool:
     """
-    Fetches ISS data from NASA and stores it in Redis using keys which are the EPOCH. Each state vector and its information are stored in a seperate key.
+    Drops the in-process cache if the signature in Redis has changed since it was filled. The signature is only re-read from Redis once the cache is older than CACHE_TTL seconds.
 
     Args:
         None
+
+    Returns:
+        cacheable (bool): True if Redis has a signature and the cache can be used
+    """
+    now = time.monotonic()
+    if _CACHE["sig"] is not None and now - _CACHE["checked"] < CACHE_TTL:
+        return True
+
+    sig = rd.get(SIG_KEY)
+    if sig != _CACHE["sig"]:
+        _CACHE.update({key: None for key in _CACHE})
+        _CACHE["sig"] = sig
+    _CACHE["checked"] = now
+    return sig is not None
+
+def _fill_cache(**slots) -> bool:
+    """
+    Stores values freshly loaded from Redis in the cache, but only if the signature in Redis still matches the one the cache was filled under. Otherwise a slot could hold a newer data set than the slots filled before it, so nothing is stored and the next request re-syncs the whole cache instead.
+
+    Args:
+        **slots: The cache slots to fill, e.g. data=state_vectors
+
+    Returns:
+        stored (bool): True if the values were stored in the cache
+    """
+    if rd.get(SIG_KEY) != _CACHE["sig"]:
+        _CACHE["sig"] = None
+        return False
+
+    _CACHE.update(slots)
+    return True
+
+def parse_state_vectors(source) -> Tuple[List[dict], dict]:
+    """
+    Stream-parses the ISS OEM XML one stateVector element at a time, building both flat state vector dictionaries and float64 arrays of the numeric fields. The units are fixed (km and km/s) so fields carrying a units attribute are stored as plain floats and the attribute is dropped.
+
+    Args:
+        source: A file-like object or path containing the OEM XML
+
+    Returns:
+        state_vectors (List[dict]): Each state vector as a dictionary, e.g. {"EPOCH": "2025-001T12:00:00.000Z", "X": 1.0, ...}
+
+        arrays (dict): The float64 arrays for X, Y, Z, X_DOT, Y_DOT and Z_DOT
+    """
+    state_vectors = []
+    columns = {field: [] for field in ARRAY_FIELDS}
+
+    for _, element in etree.iterparse(source, tag='stateVector'):
+        state_vector = {}
+        for child in element:
+            if child.attrib:
+                state_vector[child.tag] = float(child.text)
+            else:
+                state_vector[child.tag] = child.text
+
+        for field in ARRAY_FIELDS:
+            columns[field].append(state_vector[field])
+        state_vectors.append(state_vector)
+
+        # Free the element and any already processed siblings so the tree never grows
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    arrays = {field: np.array(values, dtype=np.float64) for field, values in columns.items()}
+    return state_vectors, arrays
+
+def fetch_data(force: bool = False) -> bool:
+    """
+    Fetches ISS data from NASA and stores it in Redis using keys which are the EPOCH. Each state vector and its information are stored in a seperate key.
+
+    Args:
+        force (bool): Download the data even if Redis already has a data set, replacing it
     
     Returns:
-        None
+        success (bool): True if Redis holds a data set afterwards, False if the download or store failed
     """
     ISS_URL = "https://nasa-public-data.s3.amazonaws.com/iss-coords/current/ISS_OEM/ISS.OEM_J2K_EPH.xml"
     
-    # Check if Redis already has ISS data
-    if rd.keys():
-        logging.info("Redis already contains ISS data.")
-        return 
-    
     try:
+        # Check if Redis already has ISS data
+        if not force and rd.exists(SIG_KEY):
+            logging.info("Redis already contains ISS data.")
+            return True
+
         logging.info("Fetching data from NASA...")
-        response = requests.get(ISS_URL)
+        with _SESSION.get(ISS_URL, stream=True, timeout=30) as response:
+            logging.info(f"Response status code: {response.status_code}")
+
+            if response.status_code != 200:
+                logging.error(f"Failed to fetch data. Status code: {response.status_code}")
+                return False
+
+            # Stream-parse the XML data straight off the socket, letting urllib3 undo the gzip encoding
+            response.raw.decode_content = True
+            state_vectors, arrays = parse_state_vectors(response.raw)
 
-        logging.info(f"Response status code: {response.status_code}")
-        
-        if response.status_code != 200:
-            logging.error(f"Failed to fetch data. Status code: {response.status_code}")
-            return
-        
-        # Parse the XML data
-        iss_data = xmltodict.parse(response.text)
-        logging.info(f"Data parsed successfully: {len(iss_data)} entries")
-        
-        state_vectors = iss_data['ndm']['oem']['body']['segment']['data']['stateVector']
         logging.info(f"State vectors extracted: {len(state_vectors)}")
         
         if not state_vectors:
             logging.error("No state_vector data.")
-            return
+            return False
 
-        # Iterate over the state vectors and store each one in Redis with a unique EPOCH key
-        for state_vector in (state_vectors):
-            redis_key = state_vector['EPOCH']
+        # Queue every write on one MULTI/EXEC pipeline so the whole data set is stored in a single round-trip and
+        # swapped in atomically, readers in other workers never see new arrays next to an old epoch list
+        pipe = rd.pipeline(transaction=True)
 
-            # Convert to json and dump as seen in class
-            state_vector_json = json.dumps(state_vector)
+        # Store each state vector in Redis with a unique EPOCH key, packed with MessagePack. The MSETs are
+        # split into batches so no single command has to buffer the whole data set
+        for start in range(0, len(state_vectors), WRITE_BATCH_SIZE):
+            batch = state_vectors[start:start + WRITE_BATCH_SIZE]
+            pipe.mset({state_vector['EPOCH']: _MSGPACK_ENCODER.encode(state_vector) for state_vector in batch})
 
-            rd.set(redis_key, state_vector_json)
-            logging.info(f"State vector stored in Redis with key: {redis_key}")
+        # Precompute every instantaneous speed once so the routes only index into it
+        arrays["SPEED"] = np.hypot(np.hypot(arrays["X_DOT"], arrays["Y_DOT"]), arrays["Z_DOT"])
+
+        # Parse every EPOCH once so the closest epoch to now can be found with a binary search
+        arrays["EPOCH_TS"] = np.array([_parse_epoch(sv["EPOCH"]) for sv in state_vectors], dtype=np.float64)
+
+        # Convert every position to latitude, longitude and altitude in one vectorized transform so the location
+        # routes only index into the result. NaN marks positions the routes have to compute themselves
+        try:
+            epochs = [sv["EPOCH"] for sv in state_vectors]
+            locations = compute_locations(epochs, arrays["X"], arrays["Y"], arrays["Z"])
+        except Exception as e:
+            logging.error(f"Error precomputing locations: {e}")
+            locations = [np.full(len(state_vectors), np.nan)] * 3
+        for field, values in zip(("LAT", "LON", "ALT"), locations):
+            arrays[field] = np.asarray(values, dtype=np.float64)
+
+        # Store each numeric field as one contiguous float64 array so the routes skip JSON parsing
+        for field in ARRAY_FIELDS + DERIVED_ARRAYS:
+            pipe.set(f"{ARRAY_PREFIX}{field}", arrays[field].tobytes())
+        pipe.set(f"{ARRAY_PREFIX}EPOCH", _MSGPACK_ENCODER.encode([sv["EPOCH"] for sv in state_vectors]))
+
+        # Remove the state vectors of a previous data set that are not in this one
+        old_epochs = rd_bin.get(f"{ARRAY_PREFIX}EPOCH")
+        if old_epochs is not None:
+            stale = set(_EPOCH_LIST_DECODER.decode(old_epochs)) - {sv["EPOCH"] for sv in state_vectors}
+            if stale:
+                pipe.delete(*stale)
+
+        # Bump the signature so every process drops its cached copy of the data
+        pipe.set(SIG_KEY, str(time.time()))
+
+        pipe.execute()
+        logging.info(f"Stored {len(state_vectors)} state vectors and their arrays in Redis")
+
+        # Make this process re-check the signature right away instead of waiting out CACHE_TTL
+        with _CACHE_LOCK:
+            _CACHE["sig"] = None
+
+        return True
 
     except Exception as e:
         logging.error(f"Error during data fetching: {e}")
+        return False
+
+def _data_age() -> float:
+    """
+    Returns how long ago the data set in Redis was stored, read from the timestamp fetch_data writes as the signature.
+
+    Args:
+        None
+
+    Returns:
+        age (float): Seconds since the last successful ingest, or infinity if Redis has no data set
+    """
+    sig = rd.get(SIG_KEY)
+    if sig is None:
+        return math.inf
+    return time.time() - float(sig)
+
+def _ingest_loop(interval: float = REFRESH_INTERVAL, retry_interval: float = RETRY_INTERVAL):
+    """
+    Loads the ISS data and then refreshes it from NASA once the stored data set is interval seconds old. Every worker runs this loop, the age of the data set in Redis decides when a download is due so only one of them refreshes per interval. Failed attempts, including Redis not being reachable yet, are retried after retry_interval seconds. Runs forever, meant to be the target of a daemon thread.
+
+    Args:
+        interval (float): The number of seconds between refreshes
+
+        retry_interval (float): The number of seconds to wait after a failed attempt
+
+    Returns:
+        None
+    """
+    while True:
+        try:
+            if _data_age() >= interval:
+                # Only one worker process ingests at a time, the others pick the data up through the signature
+                lock = rd.lock(INGEST_LOCK_KEY, timeout=600)
+                if lock.acquire(blocking=False):
+                    try:
+                        # Check again now the lock is held, another process may have finished a refresh just before
+                        if _data_age() >= interval:
+                            fetch_data(force=True)
+                    finally:
+                        try:
+                            lock.release()
+                        except redis.exceptions.LockError:
+                            logging.warning("The ingest lock expired before the refresh finished")
+                else:
+                    logging.info("Another process is ingesting the ISS data")
+
+            # Sleep until the data set is due for a refresh, or retry soon if there is still no fresh data
+            age = _data_age()
+            delay = interval - age if age < interval else retry_interval
+        except Exception:
+            logging.exception("Error in the ingest loop")
+            delay = retry_interval
+
+        time.sleep(delay)
+
+def start_ingest():
+    """
+    Starts the background thread that loads and refreshes the ISS data. Called once per process, either from __main__ or from the gunicorn worker hook.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    threading.Thread(target=_ingest_loop, daemon=True).start()
 
 def fetch_data_from_redis() -> list[dict]:
     """
-    This function fetches all data from Redis and returns it as a list of dictionaries.
+    This function fetches all data from Redis and returns it as a list of dictionaries. The decoded list is cached in-process and only reloaded when the signature written by fetch_data changes.
 
     Args:
         None
@@ -91,25 +332,288 @@ def fetch_data_from_redis() -> list[dict]:
         state_vectors (list[dict]): All of the state vector data as a list of dictionaries
     """
     try:
-        # Get all keys from Redis
-        keys = rd.keys()  
-        state_vectors = []
+        with _CACHE_LOCK:
+            # Serve the cached copy if the data in Redis has not changed since it was loaded
+            cacheable = _sync_cache()
+            if cacheable and _CACHE["data"] is not None:
+                logging.debug("Using cached state vectors")
+                return _CACHE["data"]
+
+            # The epoch list written by fetch_data names every state vector key, so the keyspace never has to be scanned
+            epoch_list = rd_bin.get(f"{ARRAY_PREFIX}EPOCH")
+            if epoch_list is None:
+                return []
 
-        for key in keys:
-            data = rd.get(key.decode('utf-8')) 
-            state_vector = json.loads(data.decode('utf-8'))
-            state_vectors.append(state_vector)
+            # Pull every state vector back in a single MGET round-trip
+            keys = _EPOCH_LIST_DECODER.decode(epoch_list)
+            if not keys:
+                return []
 
-        logging.info(f"Fetched {len(state_vectors)} state vectors from Redis so far.")
+            values = rd_bin.mget(keys)
+            state_vectors = [_STATE_VECTOR_DECODER.decode(value) for value in values if value is not None]
 
-        return state_vectors
+            logging.info(f"Fetched {len(state_vectors)} state vectors from Redis so far.")
+
+            if cacheable:
+                _fill_cache(data=state_vectors, by_epoch={sv["EPOCH"]: i for i, sv in enumerate(state_vectors)})
+
+            return state_vectors
     except Exception as e:
         logging.error(f"Error during Redis data fetch: {e}")
 
+def _lookup_epoch(epoch: str) -> dict:
+    """
+    Finds the state vector for an epoch using the epoch index cached alongside the data.
+
+    Args:
+        epoch (str): The epoch timestamp to look up
+
+    Returns:
+        state_vector (dict): The state vector for the epoch, or None if there is no such epoch
+
+    Raises:
+        redis.exceptions.RedisError: The state vectors could not be read from Redis
+    """
+    with _CACHE_LOCK:
+        state_vectors = fetch_data_from_redis()
+
+        # fetch_data_from_redis returns None only when reading Redis failed, which is not the same as an unknown epoch
+        if state_vectors is None:
+            raise redis.exceptions.RedisError("Could not read the state vectors from Redis")
+        if not state_vectors:
+            return None
+
+        by_epoch = _CACHE["by_epoch"]
+        if by_epoch is None:
+            # Redis has no signature yet so nothing was cached, fall back to building the index here
+            by_epoch = {sv["EPOCH"]: i for i, sv in enumerate(state_vectors)}
+
+    idx = by_epoch.get(epoch)
+    if idx is None:
+        return None
+    return state_vectors[idx]
+
+def load_arrays() -> dict:
+    """
+    This function loads the numeric state vector arrays stored by fetch_data and an index from each epoch to its position in the arrays.
+
+    Args:
+        None
+
+    Returns:
+        arrays (dict): The float64 arrays for X, Y, Z, X_DOT, Y_DOT, Z_DOT, SPEED, EPOCH_TS, LAT, LON and ALT, the "EPOCH" list, and the "index" dict mapping epoch to position. None if the arrays are not in Redis
+    """
+    try:
+        with _CACHE_LOCK:
+            cacheable = _sync_cache()
+            if cacheable and _CACHE["arrays"] is not None:
+                return _CACHE["arrays"]
+
+            fields = ARRAY_FIELDS + DERIVED_ARRAYS
+            keys = [f"{ARRAY_PREFIX}{field}" for field in fields] + [f"{ARRAY_PREFIX}EPOCH"]
+            values = rd_bin.mget(keys)
+            if any(value is None for value in values):
+                logging.error("State vector arrays are missing from Redis")
+                return None
+
+            arrays = {field: np.frombuffer(value, dtype=np.float64) for field, value in zip(fields, values)}
+            arrays["EPOCH"] = _EPOCH_LIST_DECODER.decode(values[-1])
+            arrays["index"] = {epoch: i for i, epoch in enumerate(arrays["EPOCH"])}
+
+            if cacheable:
+                _fill_cache(arrays=arrays)
+
+            return arrays
+    except Exception as e:
+        logging.error(f"Error during Redis array fetch: {e}")
+
+@functools.lru_cache(maxsize=None)
+def _year_start(year: int) -> int:
+    """
+    Returns the UTC timestamp of midnight on January 1st of a year.
+
+    Args:
+        year (int): The year
+
+    Returns:
+        timestamp (int): Seconds since the epoch at the start of the year
+    """
+    return calendar.timegm((year, 1, 1, 0, 0, 0, 0, 1, 0))
+
+@functools.lru_cache(maxsize=32768)
+def _parse_epoch(epoch: str) -> float:
+    """
+    Parses an EPOCH string into UTC seconds since the epoch. The format is fixed width, so the fields are sliced out directly instead of going through the much slower time.strptime. Results are memoized.
+
+    Args:
+        epoch (str): The EPOCH string in the form YYYY-DDDTHH:MM:SS.000Z
+
+    Returns:
+        epoch_time (float): The EPOCH as seconds since the epoch
+    """
+    if len(epoch) < 17 or epoch[4] != '-' or epoch[8] != 'T' or epoch[11] != ':' or epoch[14] != ':':
+        raise ValueError(f"Invalid EPOCH format: {epoch}")
+
+    day_of_year = int(epoch[5:8])
+    hours = int(epoch[9:11])
+    minutes = int(epoch[12:14])
+    seconds = int(epoch[15:17])
+
+    return float(_year_start(int(epoch[0:4])) + (day_of_year - 1) * 86400 + hours * 3600 + minutes * 60 + seconds)
+
+@functools.lru_cache(maxsize=32768)
+def _epoch_to_obstime(epoch: str) -> str:
+    """
+    Converts an EPOCH string into the YYYY-MM-DD HH:MM:SS form Astropy uses as an obstime. Results are memoized.
+
+    Args:
+        epoch (str): The EPOCH string in the form YYYY-DDDTHH:MM:SS.000Z
+
+    Returns:
+        obstime (str): The EPOCH formatted as YYYY-MM-DD HH:MM:SS
+    """
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.strptime(epoch[:-5], '%Y-%jT%H:%M:%S'))
+
+@functools.lru_cache(maxsize=1024)
+def _itrs_frame(obstime: str) -> coordinates.ITRS:
+    """
+    Builds the ITRS frame for an observation time. Frames are memoized since the same epochs are requested repeatedly.
+
+    Args:
+        obstime (str): The observation time formatted as YYYY-MM-DD HH:MM:SS
+
+    Returns:
+        frame (coordinates.ITRS): The ITRS frame at that observation time
+    """
+    return coordinates.ITRS(obstime=obstime)
+
+@functools.lru_cache(maxsize=8192)
+def compute_location(epoch: str, x: float, y: float, z: float) -> Tuple[float, float, float]:
+    """
+    Converts a GCRS position at an epoch into latitude, longitude, and altitude. Code from the coe-332 readthedocs, memoized since the result only depends on its inputs.
+
+    Args:
+        epoch (str): The EPOCH string of the position
+
+        x (float): The x position in km
+
+        y (float): The y position in km
+
+        z (float): The z position in km
+
+    Returns:
+        lat (float): The latitude in degrees
+
+        lon (float): The longitude in degrees
+
+        alt (float): The altitude in km
+    """
+    this_epoch = _epoch_to_obstime(epoch)
+    cartrep = coordinates.CartesianRepresentation([x, y, z], unit=units.km)
+    gcrs = coordinates.GCRS(cartrep, obstime=this_epoch)
+    itrs = gcrs.transform_to(_itrs_frame(this_epoch))
+    loc = coordinates.EarthLocation(*itrs.cartesian.xyz)
+
+    return float(loc.lat.value), float(loc.lon.value), float(loc.height.value)
+
+def compute_locations(epochs: List[str], x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Converts many GCRS positions into latitude, longitude, and altitude with a single vectorized Astropy transform, so the frame setup is paid once instead of once per epoch.
+
+    Args:
+        epochs (List[str]): The EPOCH strings of the positions
+
+        x (np.ndarray): The x positions in km
+
+        y (np.ndarray): The y positions in km
+
+        z (np.ndarray): The z positions in km
+
+    Returns:
+        lat (np.ndarray): The latitudes in degrees
+
+        lon (np.ndarray): The longitudes in degrees
+
+        alt (np.ndarray): The altitudes in km
+    """
+    obstimes = Time([_epoch_to_obstime(epoch) for epoch in epochs])
+    cartrep = coordinates.CartesianRepresentation(x, y, z, unit=units.km)
+    gcrs = coordinates.GCRS(cartrep, obstime=obstimes)
+    itrs = gcrs.transform_to(coordinates.ITRS(obstime=obstimes))
+    loc = coordinates.EarthLocation(*itrs.cartesian.xyz)
+
+    return loc.lat.value, loc.lon.value, loc.height.value
+
+def location_at(arrays: dict, idx: int) -> Tuple[float, float, float]:
+    """
+    Returns the latitude, longitude, and altitude of one epoch, using the values precomputed at ingest and only running the Astropy transform if they are missing.
+
+    Args:
+        arrays (dict): The arrays returned by load_arrays
+
+        idx (int): The index of the epoch in the arrays
+
+    Returns:
+        lat (float): The latitude in degrees
+
+        lon (float): The longitude in degrees
+
+        alt (float): The altitude in km
+    """
+    lat, lon, alt = float(arrays["LAT"][idx]), float(arrays["LON"][idx]), float(arrays["ALT"][idx])
+    if math.isfinite(lat) and math.isfinite(lon) and math.isfinite(alt):
+        return lat, lon, alt
+    return compute_location(arrays["EPOCH"][idx], float(arrays["X"][idx]), float(arrays["Y"][idx]), float(arrays["Z"][idx]))
+
+@functools.lru_cache(maxsize=4096)
+def _reverse(lat: float, lon: float) -> str:
+    """
+    Reverse geocodes a latitude and longitude with Nominatim. Callers round the coordinates to two decimals (about 1 km) so nearby positions share a cached result. Results are also kept in Redis for GEO_TTL seconds so other workers and restarts skip the Nominatim call.
+
+    Args:
+        lat (float): The rounded latitude in degrees
+
+        lon (float): The rounded longitude in degrees
+
+    Returns:
+        address (str): The address at that location, or "Ocean" if Nominatim has none
+    """
+    geo_key = f"{GEO_PREFIX}{lat}:{lon}"
+    address = rd.get(geo_key)
+    if address is not None:
+        return address
+
+    geoloc = _GEOCODER.reverse((lat, lon), zoom=30, language="en")
+    address = geoloc.address if geoloc else "Ocean"
+
+    rd.setex(geo_key, GEO_TTL, address)
+    return address
+
+def closest_epoch_index(epoch_ts: np.ndarray, time_now: float) -> int:
+    """
+    Finds the index of the epoch closest to a time with a binary search, relying on the epochs being in ascending order as they are in the OEM file.
+
+    Args:
+        epoch_ts (np.ndarray): The sorted epoch times in seconds since the epoch
+
+        time_now (float): The time to search for in seconds since the epoch
+
+    Returns:
+        idx (int): The index of the closest epoch
+    """
+    idx = int(np.searchsorted(epoch_ts, time_now))
+
+    # Step back if the epoch before the insertion point is at least as close
+    if idx > 0 and (idx == len(epoch_ts) or time_now - epoch_ts[idx - 1] <= epoch_ts[idx] - time_now):
+        idx -= 1
+    return idx
+
 def calc_closest_speed(data_list_of_dicts: List[dict], x_key_speed: str, y_key_speed: str, z_key_speed: str) -> Tuple[float, dict, dict]:
     """
     This function calculates and returns the most recent speed of the ISS compared to our time now, the time from the data set that is closest to when the script was ran, and the dictionary for that data set
 
+    No route uses this function: /now reads the SPEED and EPOCH_TS arrays stored at ingest. It is kept as a library helper for callers that only have a list of state vector dictionaries.
+
     Args:
         data_list_of_dicts (List[dict]): A list of dictionaries of all the information of each time stamp of the ISS created when reading the requested data.
 
@@ -133,41 +637,64 @@ def calc_closest_speed(data_list_of_dicts: List[dict], x_key_speed: str, y_key_s
         raise ValueError("No data available to compute closest speed")
     
     logging.debug("Finding closest current time and corresponding speed...")
-    time_now = time.mktime(time.gmtime())
+    time_now = time.time()
 
-    # Set time and EPOCH
-    closest_time = None
-    closest_epoch = None
-    min_time_diff = float('inf')
-    closest_speed = 0.
+    # Parse each row once, skipping entries with a missing or malformed field
+    rows = []
+    epoch_times = []
+    velocities = []
 
-    for i in range(len(data_list_of_dicts)):
+    for state_vector in data_list_of_dicts:
         try:
-            epoch_time = time.mktime(time.strptime(data_list_of_dicts[i]["EPOCH"], '%Y-%jT%H:%M:%S.000Z'))
-
-            # Calculating closest time to now using absolute values
-            time_diff = abs(epoch_time - time_now)
-            
-            if time_diff < min_time_diff:
-                # Set new closest time and EPOCH
-                min_time_diff = time_diff
-                closest_time = data_list_of_dicts[i]["EPOCH"]
-                closest_epoch = data_list_of_dicts[i]
-                
-                # Calculate speed for this epoch
-                x_component = float(data_list_of_dicts[i][x_key_speed]["#text"])
-                y_component = float(data_list_of_dicts[i][y_key_speed]["#text"])
-                z_component = float(data_list_of_dicts[i][z_key_speed]["#text"])
-
-                closest_speed = math.sqrt(x_component**2 + y_component**2 + z_component**2)
-
-                logging.debug(f"Updated closest epoch and speed: speed = {closest_speed} km/s")
-
+            epoch_time = _parse_epoch(state_vector["EPOCH"])
+            velocity = (float(state_vector[x_key_speed]),
+                        float(state_vector[y_key_speed]),
+                        float(state_vector[z_key_speed]))
         except (ValueError, KeyError) as e:
             logging.warning(f"Skipping epoch due to parsing error: {e}")
+            continue
+
+        rows.append(state_vector)
+        epoch_times.append(epoch_time)
+        velocities.append(velocity)
+
+    if not rows:
+        return 0., None, None
+
+    # Compute every speed in one vectorized pass and drop rows with non-finite components
+    velocities = np.array(velocities, dtype=np.float64)
+    speeds = np.linalg.norm(velocities, axis=1)
+    time_diffs = np.abs(np.array(epoch_times) - time_now)
+
+    finite = np.isfinite(speeds)
+    if not finite.all():
+        logging.warning(f"Skipping {int((~finite).sum())} epochs with non-finite velocity")
+        time_diffs[~finite] = np.inf
+        if not finite.any():
+            return 0., None, None
+
+    # Calculating closest time to now using absolute values
+    idx = int(np.argmin(time_diffs))
+    closest_speed = float(speeds[idx])
+    closest_time = rows[idx]["EPOCH"]
+    closest_epoch = rows[idx]
+
+    logging.debug(f"Closest epoch {closest_time} with speed = {closest_speed} km/s")
 
     return closest_speed, closest_time, closest_epoch
 
+def json_response(obj) -> Response:
+    """
+    Serializes an object to a JSON response with orjson, which is much faster than the standard library encoder behind jsonify.
+
+    Args:
+        obj: The list or dictionary to return
+
+    Returns:
+        response (Response): The Flask response with an application/json mimetype
+    """
+    return Response(orjson.dumps(obj), mimetype='application/json')
+
 @app.route('/epochs', methods = ['GET'])
 def get_epochs() -> list[dict]:
     """
@@ -187,6 +714,7 @@ def get_epochs() -> list[dict]:
     state_vectors = fetch_data_from_redis()
     if state_vectors is None:
         logging.error("Error no data")
+        return "Error no data"
 
     try:
         # Handle query parameters for filtering
@@ -201,30 +729,12 @@ def get_epochs() -> list[dict]:
 
         logging.debug("Applying filters")
 
-        # Apply filtering 
-        if limit is not None:
-            filtered_data = []
-            count = 0
-
-            for i in range(offset, len(state_vectors)):
-                if count >= limit:
-                    break
-                filtered_data.append(state_vectors[i])  
-                count += 1
-            state_vectors = filtered_data  
-        
-        elif offset is not None: 
-            filtered_data = []
-
-            for i in range(offset, len(state_vectors)):
-                filtered_data.append(state_vectors[i])  
-
-            state_vectors = filtered_data 
-        
-        return state_vectors
+        # Apply filtering with a single list slice
+        end = offset + limit if limit is not None else None
+        return json_response(state_vectors[offset:end])
     except ValueError:
         logging.error("Invalid query parameter format")
-        return ({"error": "Invalid query parameter format"})
+        return json_response({"error": "Invalid query parameter format"})
 
 @app.route('/epochs/<epoch>', methods = ['GET'])
 def get_epoch_data(epoch: str) -> str:
@@ -238,33 +748,28 @@ def get_epoch_data(epoch: str) -> str:
         result (str): The state vector data of a the particular epoch being requested
     """
 
-    # Retrieve data of the specific epoch from the matching epoch key
-    epoch_match = rd.get(epoch)
-
-    if not epoch_match:
-        logging.error("No data available")
-        return "Error"
-    
-    # Load the data into a Python dictionary
+    # Retrieve data of the specific epoch from the cached epoch index
+    logging.debug("Matching epochs...")
     try:
-        epoch_match = json.loads(epoch_match)
+        epoch_match = _lookup_epoch(epoch)
+    except redis.exceptions.RedisError as e:
+        logging.error(f"Error looking up epoch {epoch}: {e}")
+        return "Error: data unavailable", 503
 
-    except Exception as e:
-        logging.error(f"Failed to decode the data: {e}")
-        return "Error"
-    
-    logging.debug("Matching epochs...")
+    if epoch_match is None:
+        logging.error(f"Epoch {epoch} not found")
+        return "Error", 404
 
     logging.debug("Match found")
 
     try: 
         result = (f"Epoch: {epoch_match['EPOCH']}\n"
-                  f"X: {epoch_match['X']['#text']} km\n"
-                  f"Y: {epoch_match['Y']['#text']} km\n"
-                  f"Z: {epoch_match['Z']['#text']} km\n"
-                  f"X_DOT: {epoch_match['X_DOT']['#text']} km/s\n"
-                  f"Y_DOT: {epoch_match['Y_DOT']['#text']} km/s\n"
-                  f"Z_DOT: {epoch_match['Z_DOT']['#text']} km/s\n")
+                  f"X: {epoch_match['X']} km\n"
+                  f"Y: {epoch_match['Y']} km\n"
+                  f"Z: {epoch_match['Z']} km\n"
+                  f"X_DOT: {epoch_match['X_DOT']} km/s\n"
+                  f"Y_DOT: {epoch_match['Y_DOT']} km/s\n"
+                  f"Z_DOT: {epoch_match['Z_DOT']} km/s\n")
 
     except (KeyError, ValueError) as e:
         logging.error(f"Invalid data: {e}")
@@ -284,37 +789,20 @@ def get_epoch_speed(epoch: str) -> str:
         speed (str): The calculated instantaneous speed in km/s of a certain epoch
     """
 
-    # Retrieve data for specific epoch 
-    epoch_data = rd.get(epoch)
-
-    if not epoch_data:
+    # Look up the position of the epoch in the cached arrays
+    arrays = load_arrays()
+    if arrays is None:
         logging.error("No data available")
         return "Error"
-    
-    # Load the data into a Python dictionary
-    try:
-        epoch_data = json.loads(epoch_data)
-    except Exception as e:
-        logging.error(f"Failed to decode the data: {e}")
-        return "Error"
-    
-    logging.debug("Matching epochs...")
 
-    logging.debug("Match found")
+    idx = arrays["index"].get(epoch)
+    if idx is None:
+        logging.error(f"Epoch {epoch} not found")
+        return "Error", 404
 
-    try:
-        # Get the velocity components
-        x_dot = float(epoch_data["X_DOT"]["#text"])
-        y_dot = float(epoch_data["Y_DOT"]["#text"])
-        z_dot = float(epoch_data["Z_DOT"]["#text"])
-
-        # Calculate the instantaneous speed 
-        speed = math.sqrt(x_dot**2 + y_dot**2 + z_dot**2)
-        return (f"Instantaneous speed: {speed} (km/s)\n")
-    
-    except (KeyError, ValueError) as e:
-        logging.error(f"Invalid data: {e}")
-        return "Invalid data"
+    # The instantaneous speed was precomputed at ingest
+    speed = float(arrays["SPEED"][idx])
+    return (f"Instantaneous speed: {speed} (km/s)\n")
     
 @app.route('/epochs/<epoch>/location', methods = ['GET'])
 def get_epoch_location(epoch: str) -> str:
@@ -329,63 +817,90 @@ def get_epoch_location(epoch: str) -> str:
     """
 
     # This code is from the coe-332 readthedocs
-    # Retrieve data
-    epoch_data = rd.get(epoch)
-
-    if not epoch_data:
+    # Retrieve the already parsed position from the cached arrays
+    arrays = load_arrays()
+    if arrays is None:
         logging.error("No data available")
         return "Error"
-    
-    # Load the data to a Python dictionary
-    try:
-        epoch_data = json.loads(epoch_data)
-    except Exception as e:
-        logging.error(f"Failed to decode data: {e}")
-        return "Error"
+
+    idx = arrays["index"].get(epoch)
+    if idx is None:
+        logging.error(f"Epoch {epoch} not found")
+        return "Error", 404
     
     geoloc_address = "Ocean"
 
     try: 
-        x = float(epoch_data['X']['#text'])
-        y = float(epoch_data['Y']['#text'])
-        z = float(epoch_data['Z']['#text'])
-
         try:
-            this_epoch = time.strftime('%Y-%m-%d %H:%M:%S', time.strptime(epoch_data['EPOCH'][:-5], '%Y-%jT%H:%M:%S'))
+            lat, lon, alt = location_at(arrays, idx)
         except Exception as e:
-            logging.error(f"Error processing epoch timestamp {epoch_data['EPOCH']}: {e}")
+            logging.error(f"Error processing epoch timestamp {epoch}: {e}")
             return 
-        
-        cartrep = coordinates.CartesianRepresentation([x, y, z], unit=units.km)
-        gcrs = coordinates.GCRS(cartrep, obstime=this_epoch)
-        itrs = gcrs.transform_to(coordinates.ITRS(obstime=this_epoch))
-        loc = coordinates.EarthLocation(*itrs.cartesian.xyz)
-
-        lat, lon, alt = loc.lat.value, loc.lon.value, loc.height.value
 
         # Use GeoPy for geolocation lookup
         try:
-            geocoder = Nominatim(user_agent="iss_tracker")
-            geoloc = geocoder.reverse((lat, lon), zoom=30, language="en")
-            if geoloc:
-                geoloc_address = geoloc.address
+            geoloc_address = _reverse(round(lat, 2), round(lon, 2))
         except Exception as e:
             logging.error(f"Error: {e}")
             return
 
         logging.info(f"Location for epoch {epoch} calculated successfully.")
 
-        return {
+        return json_response({
             "Latitude": lat,
             "Longitude": lon,
             "Altitude": alt,
             "Geolocation": geoloc_address
-        }
+        })
     
     except Exception as e:
         logging.error(f"Error: {e}")
         return
 
+@app.route('/locations', methods = ['GET'])
+def get_locations() -> list[dict]:
+    """
+    This route returns the latitude, longitude, and altitude of every epoch (or a limited amount of epochs), precomputed in one batch at ingest
+
+    Args:
+        None
+
+    Query Parameters:
+        limit (int): Number of epochs to return
+        offset (int): Number of epochs to skip before starting
+
+    Returns:
+        A list of dictionaries with the epoch, latitude, longitude and altitude of each epoch
+    """
+
+    arrays = load_arrays()
+    if arrays is None:
+        logging.error("No data available")
+        return "Error"
+
+    limit = request.args.get('limit', type=int)
+    offset = request.args.get('offset', type=int, default=0)
+
+    if offset < 0 or offset >= len(arrays["EPOCH"]):
+        logging.warning("Offset is out of range")
+        return "Error: Offset out of range"
+
+    end = offset + limit if limit is not None else None
+    epochs = arrays["EPOCH"][offset:end]
+
+    lat, lon, alt = arrays["LAT"][offset:end], arrays["LON"][offset:end], arrays["ALT"][offset:end]
+
+    # Fall back to one batched transform if the ingest could not precompute the locations
+    if not (np.isfinite(lat).all() and np.isfinite(lon).all() and np.isfinite(alt).all()):
+        try:
+            lat, lon, alt = compute_locations(epochs, arrays["X"][offset:end], arrays["Y"][offset:end], arrays["Z"][offset:end])
+        except Exception as e:
+            logging.error(f"Error calculating locations: {e}")
+            return "Error"
+
+    return json_response([{"EPOCH": epoch, "Latitude": float(lat[i]), "Longitude": float(lon[i]), "Altitude": float(alt[i])}
+                          for i, epoch in enumerate(epochs)])
+
 @app.route('/now', methods = ['GET'])
 def get_current_state_vector_and_speed() -> str:
     """
@@ -398,42 +913,42 @@ def get_current_state_vector_and_speed() -> str:
         response (str): This function returns the state vectors, instantaneous speed, latitude, longitude, altitude and geoposition for the Epoch that is nearest in time as a string
     """
 
+    # Reuse the response built earlier in the same NOW_TTL bucket, the closest epoch barely moves in a few seconds
+    bucket = int(time.time() // NOW_TTL)
+    last = _NOW_CACHE["last"]
+    if last is not None and last[0] == bucket:
+        return last[1]
+
     # Retrieve data
-    state_vectors = fetch_data_from_redis()
-    if state_vectors is None:
+    arrays = load_arrays()
+    if not arrays or not arrays["EPOCH"]:
         logging.error("Error no data")
         return ("Error no data")
     
-    # Logging done by calc_closest_speed
-    closest_speed, closest_time, closest_epoch = calc_closest_speed(state_vectors, "X_DOT", "Y_DOT", "Z_DOT")
+    # Binary search the sorted epoch times for the epoch closest to now, the speed was precomputed at ingest
+    idx = closest_epoch_index(arrays["EPOCH_TS"], time.time())
+    closest_time = arrays["EPOCH"][idx]
+    closest_speed = float(arrays["SPEED"][idx])
 
-    x = closest_epoch["X"]["#text"]
-    y = closest_epoch["Y"]["#text"]
-    z = closest_epoch["Z"]["#text"]
-    x_velocity = closest_epoch["X_DOT"]["#text"]
-    y_velocity = closest_epoch["Y_DOT"]["#text"]
-    z_velocity = closest_epoch["Z_DOT"]["#text"]
+    logging.debug(f"Closest epoch {closest_time} with speed = {closest_speed} km/s")
+
+    # Position and velocity were parsed to floats at ingest
+    x, y, z = float(arrays["X"][idx]), float(arrays["Y"][idx]), float(arrays["Z"][idx])
+    x_velocity, y_velocity, z_velocity = float(arrays["X_DOT"][idx]), float(arrays["Y_DOT"][idx]), float(arrays["Z_DOT"][idx])
 
     geoloc_address = "Ocean"
 
-    # Compute location (latitude, longitude, altitude), Code from coe-332 readthedocs
+    # Location (latitude, longitude, altitude) was precomputed at ingest, Code from coe-332 readthedocs
     try:
-        this_epoch = time.strftime('%Y-%m-%d %H:%M:%S', time.strptime(closest_epoch['EPOCH'][:-5], '%Y-%jT%H:%M:%S'))
-        cartrep = coordinates.CartesianRepresentation([x, y, z], unit=units.km)
-        gcrs = coordinates.GCRS(cartrep, obstime=this_epoch)
-        itrs = gcrs.transform_to(coordinates.ITRS(obstime=this_epoch))
-        loc = coordinates.EarthLocation(*itrs.cartesian.xyz)
-
-        lat, lon, alt = loc.lat.value, loc.lon.value, loc.height.value
+        lat, lon, alt = location_at(arrays, idx)
     except Exception as e:
         logging.error(f"Error calculating location: {e}")
         return
 
+    geocoded = False
     try:
-        geocoder = Nominatim(user_agent="iss_tracker")
-        geoloc = geocoder.reverse((lat, lon), zoom=30, language="en")
-        if geoloc:
-            geoloc_address = geoloc.address 
+        geoloc_address = _reverse(round(lat, 2), round(lon, 2))
+        geocoded = True
     except Exception as e:
         logging.error(f"GeoPy error: {e}")
 
@@ -447,9 +962,15 @@ def get_current_state_vector_and_speed() -> str:
         f"Altitude: {alt} km\n"
         f"Geolocation: {geoloc_address}\n"
     )
+
+    # Only keep complete responses, a failed geocode is retried on the next request
+    if geocoded:
+        _NOW_CACHE["last"] = (bucket, response)
     return response
 
 if __name__ == '__main__':
-    # Store data in Redis
-    fetch_data()
-    app.run(debug=True, host='0.0.0.0')
+    # Store data in Redis from a background thread that keeps it fresh, so the server starts right away
+    start_ingest()
+
+    # Development server only, the container runs the app under gunicorn (see gunicorn.conf.py)
+    app.run(debug=False, host='0.0.0.0', threaded=True)
@@ -1,31 +1,59 @@
 import pytest
-import math
-import json
+import calendar
+import time
 from unittest import mock
-import requests
-import json
-from iss_tracker import calc_closest_speed
-import pytest
-from flask import Flask, jsonify
-
-# Create a minimal Flask app for testing purposes (AI Use)
-app = Flask(__name__)
-
-# Tests for route functions
-BASE_URL = 'http://127.0.0.1:5000'
+from iss_tracker import calc_closest_speed, fetch_data_from_redis, load_arrays, _lookup_epoch, parse_state_vectors, compute_location, compute_locations, _reverse, closest_epoch_index, location_at, _parse_epoch, _ingest_loop, fetch_data, SIG_KEY, app as iss_app
+import io
+import numpy as np
+import msgspec
+import redis
+import iss_tracker
 
 # Test data is AI generated
 test_data = [
-    {'X_DOT': {'#text': '7.0'}, 'Y_DOT': {'#text': '3.0'}, 'Z_DOT': {'#text': '5.0'}, 'EPOCH': '2025-001T12:00:00.000Z'},
-    {'X_DOT': {'#text': '5.0'}, 'Y_DOT': {'#text': '2.0'}, 'Z_DOT': {'#text': '4.0'}, 'EPOCH': '2025-002T12:00:00.000Z'},
-    {'X_DOT': {'#text': '6.0'}, 'Y_DOT': {'#text': '2.0'}, 'Z_DOT': {'#text': '6.0'}, 'EPOCH': '2025-003T12:00:00.000Z'},
-    {'X_DOT': {'#text': '4.0'}, 'Y_DOT': {'#text': '4.0'}, 'Z_DOT': {'#text': '4.0'}, 'EPOCH': '2025-004T12:00:00.000Z'}
+    {'X_DOT': 7.0, 'Y_DOT': 3.0, 'Z_DOT': 5.0, 'EPOCH': '2025-001T12:00:00.000Z'},
+    {'X_DOT': 5.0, 'Y_DOT': 2.0, 'Z_DOT': 4.0, 'EPOCH': '2025-002T12:00:00.000Z'},
+    {'X_DOT': 6.0, 'Y_DOT': 2.0, 'Z_DOT': 6.0, 'EPOCH': '2025-003T12:00:00.000Z'},
+    {'X_DOT': 4.0, 'Y_DOT': 4.0, 'Z_DOT': 4.0, 'EPOCH': '2025-004T12:00:00.000Z'}
 ]
 
+# Minimal OEM document with the same layout as the NASA file
+test_xml = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ndm><oem><body><segment><data>
+<stateVector><EPOCH>2025-001T12:00:00.000Z</EPOCH><X units="km">1.0</X><Y units="km">2.0</Y><Z units="km">3.0</Z><X_DOT units="km/s">7.0</X_DOT><Y_DOT units="km/s">3.0</Y_DOT><Z_DOT units="km/s">5.0</Z_DOT></stateVector>
+<stateVector><EPOCH>2025-002T12:00:00.000Z</EPOCH><X units="km">4.0</X><Y units="km">5.0</Y><Z units="km">6.0</Z><X_DOT units="km/s">5.0</X_DOT><Y_DOT units="km/s">2.0</Y_DOT><Z_DOT units="km/s">4.0</Z_DOT></stateVector>
+</data></segment></body></oem></ndm>"""
+
+# Test that parse_state_vectors streams the XML into dictionaries and float arrays
+def test_parse_state_vectors():
+    state_vectors, arrays = parse_state_vectors(io.BytesIO(test_xml))
+
+    assert len(state_vectors) == 2
+    assert state_vectors[0]['EPOCH'] == '2025-001T12:00:00.000Z'
+    assert state_vectors[1]['X_DOT'] == 5.0
+    assert list(arrays['Z']) == [3.0, 6.0]
+
 # Test calc_instant_speed function taking only the speed
 def test_calc_closest_speed():
     assert calc_closest_speed(test_data, 'X_DOT', 'Y_DOT', 'Z_DOT')[0] == pytest.approx(6.928203230275509, rel=1e-4)
 
+# Test that the fixed-width EPOCH parser matches calendar.timegm and rejects malformed strings
+def test_parse_epoch():
+    expected = calendar.timegm(time.strptime('2025-032T01:02:03', '%Y-%jT%H:%M:%S'))
+    assert _parse_epoch('2025-032T01:02:03.000Z') == expected
+
+    with pytest.raises(ValueError):
+        _parse_epoch('2025/032 01:02:03')
+
+# Test that the binary search picks the nearest epoch on either side of the insertion point
+def test_closest_epoch_index():
+    epoch_ts = np.array([100.0, 200.0, 300.0])
+    assert closest_epoch_index(epoch_ts, 0.0) == 0
+    assert closest_epoch_index(epoch_ts, 140.0) == 0
+    assert closest_epoch_index(epoch_ts, 160.0) == 1
+    assert closest_epoch_index(epoch_ts, 300.0) == 2
+    assert closest_epoch_index(epoch_ts, 1000.0) == 2
+
 # Exception tests are AI Generated
 
 # Exception test for calc_closest_speed
@@ -36,53 +64,272 @@ def test_calc_closest_speed_exceptions():
 
     # Missing keys should not raise ValueError, but skip the invalid entries
     test_data_missing_keys = [
-        {'X_DOT': {'#text': '7.0'}, 'Y_DOT': {'#text': '3.0'}, 'EPOCH': '2025-001T12:00:00.000Z'}
+        {'X_DOT': 7.0, 'Y_DOT': 3.0, 'EPOCH': '2025-001T12:00:00.000Z'}
     ]
     result = calc_closest_speed(test_data_missing_keys, 'X_DOT', 'Y_DOT', 'Z_DOT')
     assert result[0] == 0.0  # If no valid speed data, the closest speed should be 0.0
 
     # Non-numeric velocity values should not raise ValueError, but skip the entry
     test_data_invalid_type = [
-        {'X_DOT': {'#text': '7.0'}, 'Y_DOT': {'#text': 'abc'}, 'Z_DOT': {'#text': '5.0'}, 'EPOCH': '2025-001T12:00:00.000Z'}
+        {'X_DOT': 7.0, 'Y_DOT': 'abc', 'Z_DOT': 5.0, 'EPOCH': '2025-001T12:00:00.000Z'}
     ]
     result = calc_closest_speed(test_data_invalid_type, 'X_DOT', 'Y_DOT', 'Z_DOT')
     assert result[0] == 0.0  # If the invalid value is skipped, the closest speed should be 0.0
 
 @pytest.fixture
-def setup_flask_app():
-    response = requests.get(f'{BASE_URL}/epochs')  
-    assert response.status_code == 200  
-    return response
+def empty_cache():
+    # Start every test from an empty in-process cache, whatever keys _CACHE grows
+    with mock.patch.dict('iss_tracker._CACHE', {key: None for key in iss_tracker._CACHE}), \
+            mock.patch.dict('iss_tracker._NOW_CACHE', {key: None for key in iss_tracker._NOW_CACHE}):
+        yield
+
+@pytest.fixture
+def redis_data(empty_cache):
+    # Redis clients holding test_data the way fetch_data stores it, under signature '1'
+    with mock.patch('iss_tracker.rd') as mock_rd, mock.patch('iss_tracker.rd_bin') as mock_rd_bin:
+        mock_rd.get.return_value = '1'
+        mock_rd_bin.get.return_value = msgspec.msgpack.encode([sv['EPOCH'] for sv in test_data])
+        mock_rd_bin.mget.return_value = [msgspec.msgpack.encode(sv) for sv in test_data]
+        yield mock_rd, mock_rd_bin
+
+# Test that fetch_data_from_redis reads every key back with a single MGET
+def test_fetch_data_from_redis(redis_data):
+    mock_rd, mock_rd_bin = redis_data
+
+    result = fetch_data_from_redis()
+
+    mock_rd_bin.mget.assert_called_once_with([sv['EPOCH'] for sv in test_data])
+    mock_rd.keys.assert_not_called()
+    assert result == test_data
+
+    # A second call with the same signature should be served from the in-process cache
+    assert fetch_data_from_redis() == test_data
+    mock_rd_bin.mget.assert_called_once()
+
+# Test that a slot loaded after the signature changed is not cached next to slots from the older data set
+def test_fill_cache_signature_changed(redis_data):
+    mock_rd, _ = redis_data
+
+    # The signature is '1' when the cache is synced but a new data set '2' lands before the load finishes
+    mock_rd.get.side_effect = ['1', '2', '2', '2']
+
+    assert fetch_data_from_redis() == test_data
+    assert iss_tracker._CACHE["data"] is None
+
+    # The next call re-syncs to the new signature and caches it
+    assert fetch_data_from_redis() == test_data
+    assert iss_tracker._CACHE["sig"] == '2'
+    assert iss_tracker._CACHE["data"] == test_data
+
+# Test that _lookup_epoch finds state vectors through the cached epoch index
+def test_lookup_epoch(redis_data):
+    assert _lookup_epoch('2025-002T12:00:00.000Z') == test_data[1]
+    assert _lookup_epoch('2025-999T12:00:00.000Z') is None
+
+# Test that a Redis failure is reported as 503 by /epochs/<epoch> instead of looking like an unknown epoch
+def test_epoch_route_redis_error(redis_data):
+    _, mock_rd_bin = redis_data
+    mock_rd_bin.get.side_effect = redis.exceptions.ConnectionError("redis down")
+
+    with pytest.raises(redis.exceptions.RedisError):
+        _lookup_epoch('2025-002T12:00:00.000Z')
+
+    response = iss_app.test_client().get('/epochs/2025-002T12:00:00.000Z')
+    assert response.status_code == 503
+
+# Test that load_arrays rebuilds the float arrays and the epoch index from the raw bytes
+def test_load_arrays(redis_data):
+    _, mock_rd_bin = redis_data
+    fields = ('X', 'Y', 'Z', 'X_DOT', 'Y_DOT', 'Z_DOT', 'SPEED', 'EPOCH_TS', 'LAT', 'LON', 'ALT')
+    raw = [np.arange(4, dtype=np.float64).tobytes() for _ in fields]
+    raw.append(msgspec.msgpack.encode([sv['EPOCH'] for sv in test_data]))
+    mock_rd_bin.mget.return_value = raw
+
+    arrays = load_arrays()
+
+    assert list(arrays['X_DOT']) == [0.0, 1.0, 2.0, 3.0]
+    assert arrays['index']['2025-003T12:00:00.000Z'] == 2
+
+# Test that compute_location returns a plausible position and memoizes repeat calls
+def test_compute_location():
+    compute_location.cache_clear()
+    lat, lon, alt = compute_location('2025-001T12:00:00.000Z', -4000.0, 3000.0, 4000.0)
+
+    assert -90 <= lat <= 90
+    assert -180 <= lon <= 180
+    assert compute_location('2025-001T12:00:00.000Z', -4000.0, 3000.0, 4000.0) == (lat, lon, alt)
+    assert compute_location.cache_info().hits == 1
+
+# Test that the batched transform agrees with the single-epoch transform
+def test_compute_locations():
+    epochs = ['2025-001T12:00:00.000Z', '2025-002T12:00:00.000Z']
+    x = np.array([-4000.0, 4000.0])
+    y = np.array([3000.0, -3000.0])
+    z = np.array([4000.0, 2000.0])
+
+    lat, lon, alt = compute_locations(epochs, x, y, z)
+
+    for i in range(len(epochs)):
+        expected = compute_location(epochs[i], x[i], y[i], z[i])
+        assert (lat[i], lon[i], alt[i]) == pytest.approx(expected, rel=1e-6)
+
+# Test that location_at uses the precomputed values and only transforms when they are missing
+def test_location_at():
+    arrays = {'EPOCH': ['2025-001T12:00:00.000Z'], 'X': np.array([-4000.0]), 'Y': np.array([3000.0]), 'Z': np.array([4000.0]),
+              'LAT': np.array([1.0]), 'LON': np.array([2.0]), 'ALT': np.array([3.0])}
+    assert location_at(arrays, 0) == (1.0, 2.0, 3.0)
+
+    arrays['LAT'] = np.array([np.nan])
+    assert location_at(arrays, 0) == pytest.approx(compute_location('2025-001T12:00:00.000Z', -4000.0, 3000.0, 4000.0))
+
+# Test that _reverse reuses cached addresses instead of calling Nominatim again
+def test_reverse_geocode_cache():
+    _reverse.cache_clear()
+    with mock.patch('iss_tracker._GEOCODER') as mock_geocoder, mock.patch('iss_tracker.rd') as mock_rd:
+        mock_rd.get.return_value = None
+        mock_geocoder.reverse.return_value = mock.Mock(address='Austin, Texas')
+        assert _reverse(30.27, -97.74) == 'Austin, Texas'
+        assert _reverse(30.27, -97.74) == 'Austin, Texas'
+        mock_geocoder.reverse.assert_called_once()
+        mock_rd.setex.assert_called_once_with('geo:30.27:-97.74', 86400, 'Austin, Texas')
+
+        # An address already stored in Redis should skip Nominatim entirely
+        mock_rd.get.return_value = 'Houston, Texas'
+        assert _reverse(29.76, -95.37) == 'Houston, Texas'
+        mock_geocoder.reverse.assert_called_once()
+        mock_rd.get.return_value = None
+
+        mock_geocoder.reverse.return_value = None
+        assert _reverse(0.0, 0.0) == 'Ocean'
+    _reverse.cache_clear()
+
+# Test that fetch_data stores a download in one transaction, in MSET batches, and drops epochs missing from it
+def test_fetch_data(empty_cache):
+    response = mock.MagicMock(status_code=200, raw=io.BytesIO(test_xml))
+    stale_epoch = '2024-366T12:00:00.000Z'
+
+    with mock.patch('iss_tracker._SESSION') as mock_session, mock.patch('iss_tracker.rd') as mock_rd, \
+            mock.patch('iss_tracker.rd_bin') as mock_rd_bin, mock.patch('iss_tracker.WRITE_BATCH_SIZE', 1):
+        mock_session.get.return_value.__enter__.return_value = response
+        mock_rd_bin.get.return_value = msgspec.msgpack.encode(['2025-001T12:00:00.000Z', stale_epoch])
+        pipe = mock_rd.pipeline.return_value
+
+        assert fetch_data(force=True) is True
+
+        mock_rd.pipeline.assert_called_once_with(transaction=True)
+        assert pipe.mset.call_count == 2
+        pipe.delete.assert_called_once_with(stale_epoch)
+        assert SIG_KEY in [c.args[0] for c in pipe.set.call_args_list]
+        pipe.execute.assert_called_once()
+
+        # A failed download stores nothing
+        response.status_code = 500
+        mock_rd.pipeline.reset_mock()
+        assert fetch_data(force=True) is False
+        mock_rd.pipeline.assert_not_called()
+
+# Test that the ingest loop survives Redis errors and failed downloads, and only refreshes data sets that are due
+def test_ingest_loop_retries():
+    class StopLoop(Exception):
+        pass
+
+    with mock.patch('iss_tracker.rd') as mock_rd, mock.patch('iss_tracker.fetch_data') as mock_fetch, \
+            mock.patch('iss_tracker.time.time', return_value=1000.0), \
+            mock.patch('iss_tracker.time.sleep', side_effect=[None, None, None, StopLoop]) as mock_sleep:
+        # Redis is down, then the first download fails, then it succeeds, then the data set is 40 s old
+        mock_rd.get.side_effect = [ConnectionError("redis not ready"),
+                                   None, None, None,
+                                   None, None, '1000.0',
+                                   '960.0', '960.0']
+        mock_rd.lock.return_value.acquire.return_value = True
+        mock_rd.lock.return_value.release.side_effect = redis.exceptions.LockNotOwnedError("expired")
+
+        with pytest.raises(StopLoop):
+            _ingest_loop(interval=100, retry_interval=1)
+
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [1, 1, 100, 60]
+        assert mock_fetch.call_count == 2
+
+# Test that /now reuses its rendered response within a NOW_TTL bucket
+def test_now_response_cache(empty_cache):
+    arrays = {'EPOCH': ['2025-001T12:00:00.000Z'], 'EPOCH_TS': np.array([0.0]), 'SPEED': np.array([7.0]),
+              'X': np.array([1.0]), 'Y': np.array([2.0]), 'Z': np.array([3.0]),
+              'X_DOT': np.array([7.0]), 'Y_DOT': np.array([0.0]), 'Z_DOT': np.array([0.0]),
+              'LAT': np.array([1.0]), 'LON': np.array([2.0]), 'ALT': np.array([3.0])}
+    with mock.patch('iss_tracker.load_arrays', return_value=arrays) as mock_load, \
+            mock.patch('iss_tracker._reverse', return_value='Somewhere'), \
+            mock.patch('iss_tracker.NOW_TTL', 1e9):
+        client = iss_app.test_client()
+        first = client.get('/now')
+        second = client.get('/now')
+
+        assert first.status_code == 200
+        assert 'Geolocation: Somewhere' in first.get_data(as_text=True)
+        assert second.get_data() == first.get_data()
+        assert mock_load.call_count == 1
+
+# Tests for route functions, served in-process by the Flask test client with the Redis data mocked out
+route_state_vectors = [
+    {'EPOCH': '2025-001T12:00:00.000Z', 'X': -4000.0, 'Y': 3000.0, 'Z': 4000.0, 'X_DOT': 7.0, 'Y_DOT': 0.0, 'Z_DOT': 1.0},
+    {'EPOCH': '2025-001T12:04:00.000Z', 'X': -3000.0, 'Y': 4000.0, 'Z': 4000.0, 'X_DOT': 6.0, 'Y_DOT': 3.0, 'Z_DOT': 1.0}
+]
+
+@pytest.fixture
+def setup_flask_app(empty_cache):
+    arrays = {field: np.array([sv[field] for sv in route_state_vectors]) for field in ('X', 'Y', 'Z', 'X_DOT', 'Y_DOT', 'Z_DOT')}
+    arrays['SPEED'] = np.linalg.norm(np.column_stack([arrays['X_DOT'], arrays['Y_DOT'], arrays['Z_DOT']]), axis=1)
+    arrays['EPOCH_TS'] = np.array([_parse_epoch(sv['EPOCH']) for sv in route_state_vectors])
+    arrays['LAT'], arrays['LON'], arrays['ALT'] = np.array([1.0, 2.0]), np.array([3.0, 4.0]), np.array([400.0, 410.0])
+    arrays['EPOCH'] = [sv['EPOCH'] for sv in route_state_vectors]
+    arrays['index'] = {epoch: i for i, epoch in enumerate(arrays['EPOCH'])}
+
+    with mock.patch('iss_tracker.fetch_data_from_redis', return_value=route_state_vectors), \
+            mock.patch('iss_tracker.load_arrays', return_value=arrays), \
+            mock.patch('iss_tracker._reverse', return_value='Somewhere'):
+        with iss_app.test_client() as client:
+            yield client
 
 
 def test_epochs_route(setup_flask_app):
     # Test the /epochs route
-    response1 = requests.get(f'{BASE_URL}/epochs')
+    response1 = setup_flask_app.get('/epochs')
     assert response1.status_code == 200
-    assert isinstance(response1.json(), list)  
+    assert isinstance(response1.get_json(), list)
+
+    response2 = setup_flask_app.get('/epochs?limit=1&offset=1')
+    assert response2.get_json() == route_state_vectors[1:]
+
+
+def test_specific_epoch_route(setup_flask_app):
+    representative_epoch = route_state_vectors[0]
+
+    response1 = setup_flask_app.get(f'/epochs/{representative_epoch["EPOCH"]}')
+    assert response1.status_code == 200
+    assert "X_DOT: 7.0 km/s" in response1.get_data(as_text=True)
+
+    response2 = setup_flask_app.get('/epochs/not-an-epoch')
+    assert response2.status_code == 404
 
 
 def test_epoch_speed_route(setup_flask_app):
-    response1 = requests.get(f'{BASE_URL}/epochs')
-    representative_epoch = response1.json()[0]
-    
-    response2 = requests.get(f'{BASE_URL}/epochs/{representative_epoch["EPOCH"]}/speed')
-    
+    representative_epoch = route_state_vectors[0]
+
+    response2 = setup_flask_app.get(f'/epochs/{representative_epoch["EPOCH"]}/speed')
+
     assert response2.status_code == 200
-    assert isinstance(response2.text, str)  
+    assert isinstance(response2.get_data(as_text=True), str)
 
 
 # AI Use
 def test_epoch_location_route(setup_flask_app):
     # Test /epochs/<epoch>/location
-    response1 = requests.get(f'{BASE_URL}/epochs')
-    representative_epoch = response1.json()[0]
-    
-    response2 = requests.get(f'{BASE_URL}/epochs/{representative_epoch["EPOCH"]}/location')
-    
+    representative_epoch = route_state_vectors[0]
+
+    response2 = setup_flask_app.get(f'/epochs/{representative_epoch["EPOCH"]}/location')
+
     assert response2.status_code == 200
-    location_data = response2.json()
-    assert isinstance(location_data, dict)  
+    location_data = response2.get_json()
+    assert isinstance(location_data, dict)
     assert "Latitude" in location_data
     assert "Longitude" in location_data
     assert "Altitude" in location_data
@@ -90,9 +337,9 @@ def test_epoch_location_route(setup_flask_app):
 
 def test_get_current_state_vector_and_speed(setup_flask_app):
     # Test /now route
-    response = requests.get(f'{BASE_URL}/now')
+    response = setup_flask_app.get('/now')
     assert response.status_code == 200
-    assert isinstance(response.text, str)
+    assert isinstance(response.get_data(as_text=True), str)
 
 if __name__ == "__main__":
-    pytest.main()
\ No newline at end of file
+    pytest.main()